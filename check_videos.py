@@ -4,17 +4,18 @@ import argparse
 import sys
 from datetime import datetime
 
+from file_utils import walk_files, progress_printer
+
 # --- LIBRARIES ---
-try:
-    from hachoir.parser import createParser
-    from hachoir.metadata import extractMetadata
-except ImportError:
-    print("[ERROR] 'hachoir' library not found.")
-    print("Please run: pip install hachoir")
-    sys.exit(1)
+# MP4/MOV headers are parsed directly; other containers need pymediainfo (or hachoir)
+from video_meta import read_video_meta, MEDIAINFO_AVAILABLE, HACHOIR_AVAILABLE
+if not (MEDIAINFO_AVAILABLE or HACHOIR_AVAILABLE):
+    print("[WARNING] Neither 'pymediainfo' nor 'hachoir' installed. Only MP4/MOV files will be checked.")
+    print("Please run: pip install pymediainfo")
 
 # --- CONFIGURATION ---
 VIDEO_EXTENSIONS = {'.mp4', '.mov', '.avi', '.mkv', '.wmv', '.flv', '.mts', '.m2ts'}
+VIDEO_EXTS_T = tuple(VIDEO_EXTENSIONS)
 IGNORE_DIRS = {'$RECYCLE.BIN', 'System Volume Information', 'Recycled', '.Trashes', '.venv', '.git'}
 
 def get_video_info(filepath):
@@ -22,27 +23,8 @@ def get_video_info(filepath):
     Attempts to parse the video.
     Returns: (is_valid, details_string)
     """
-    try:
-        parser = createParser(filepath)
-        if not parser:
-            return False, "Header unreadable"
-
-        with parser:
-            metadata = extractMetadata(parser)
-            if not metadata:
-                return False, "No metadata found"
-
-            # A valid video must have at least a duration or a resolution
-            duration = metadata.get('duration')
-            width = metadata.get('width')
-            
-            if duration or width:
-                return True, f"Valid (Duration: {duration}, Res: {width})"
-            else:
-                return False, "Empty metadata (Zombie file)"
-                
-    except Exception as e:
-        return False, f"Crash during parse: {str(e)}"
+    is_valid, _, details = read_video_meta(filepath)
+    return is_valid, details
 
 def scan_videos(src_dir, quarantine_dir=None, move_corrupt=False):
     src_dir = os.path.abspath(src_dir)
@@ -56,44 +38,38 @@ def scan_videos(src_dir, quarantine_dir=None, move_corrupt=False):
             os.makedirs(quarantine_dir)
             print(f"[INFO] Created quarantine folder: {quarantine_dir}")
 
-    for root, dirs, files in os.walk(src_dir):
-        # Skip ignore dirs
-        dirs[:] = [d for d in dirs if d not in IGNORE_DIRS and not d.startswith('.')]
+    show_progress = progress_printer()
+    for entry in walk_files(src_dir, VIDEO_EXTS_T, IGNORE_DIRS):
+        filename = entry.name
+        filepath = entry.path
+        stats['total'] += 1
         
-        for filename in files:
-            ext = os.path.splitext(filename)[1].lower()
-            if ext not in VIDEO_EXTENSIONS:
-                continue
+        # Print current file (overwrite line for clean output)
+        show_progress(f"Checking: {filename}...")
 
-            filepath = os.path.join(root, filename)
-            stats['total'] += 1
-            
-            # Print current file (overwrite line for clean output)
-            print(f"Checking: {filename}...", end='\r')
-
-            is_valid, message = get_video_info(filepath)
+        is_valid, message = get_video_info(filepath)
 
-            if is_valid:
-                stats['valid'] += 1
-                # Optional: Uncomment to see valid files
-                # print(f"[OK] {filename} - {message}") 
-            else:
-                stats['corrupt'] += 1
-                print(f" [CORRUPT] {filename}")
-                print(f"    -> Reason: {message}")
-                
-                if move_corrupt and quarantine_dir:
-                    try:
-                        target = os.path.join(quarantine_dir, filename)
-                        # Handle name collision
-                        if os.path.exists(target):
-                            base, ext = os.path.splitext(filename)
-                            target = os.path.join(quarantine_dir, f"{base}_{datetime.now().strftime('%M%S')}{ext}")
-                            
-                        shutil.move(filepath, target)
-                        print(f"    -> MOVED to Quarantine")
-                    except Exception as e:
-                        print(f"    -> ERROR MOVING: {e}")
+        if is_valid:
+            stats['valid'] += 1
+            # Optional: Uncomment to see valid files
+            # print(f"[OK] {filename} - {message}") 
+        else:
+            stats['corrupt'] += 1
+            print(f" [CORRUPT] {filename}")
+            print(f"    -> Reason: {message}")
+            
+            if move_corrupt and quarantine_dir:
+                try:
+                    target = os.path.join(quarantine_dir, filename)
+                    # Handle name collision
+                    if os.path.exists(target):
+                        base, ext = os.path.splitext(filename)
+                        target = os.path.join(quarantine_dir, f"{base}_{datetime.now().strftime('%M%S')}{ext}")
+                        
+                    shutil.move(filepath, target)
+                    print(f"    -> MOVED to Quarantine")
+                except Exception as e:
+                    print(f"    -> ERROR MOVING: {e}")
 
     print("-" * 60)
     print(f"Scan Complete.")
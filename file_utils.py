@@ -0,0 +1,89 @@
+import os
+import hashlib
+import mmap
+import sys
+import time
+
+# --- LIBRARIES ---
+# Fast Hashing (BLAKE3, falls back to stdlib BLAKE2b)
+try:
+    import blake3
+    HASH_ALGO = 'blake3'
+except ImportError:
+    blake3 = None
+    HASH_ALGO = 'blake2b'
+
+# --- CONFIGURATION ---
+PROGRESS_INTERVAL = 0.1 # Seconds between progress line redraws (~10 Hz)
+
+def new_hasher():
+    """
+    BLAKE3 if installed, otherwise BLAKE2b with the same 256-bit digest.
+    Single-threaded: every caller already hashes one file per worker thread or process,
+    so BLAKE3's own thread pool would oversubscribe the cores.
+    """
+    if blake3:
+        return blake3.blake3()
+    return hashlib.blake2b(digest_size=32)
+
+def get_file_hash(filepath):
+    """
+    Hex digest of the file's bytes (BLAKE3 or BLAKE2b).
+    Read errors are raised; callers decide whether to log or skip.
+    """
+    if blake3:
+        # Memory-mapped hashing inside the extension (releases the GIL)
+        return new_hasher().update_mmap(filepath).hexdigest()
+    with open(filepath, 'rb') as f:
+        try:
+            # Hash straight from the page cache: no per-chunk bytes copies
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                hasher = new_hasher()
+                hasher.update(mm)
+                return hasher.hexdigest()
+        except (ValueError, OverflowError, OSError):
+            pass # Empty file, or too large to map (32-bit builds)
+        # file_digest runs the whole read/update loop in C (Python 3.11+)
+        if sys.version_info >= (3, 11):
+            return hashlib.file_digest(f, new_hasher).hexdigest()
+        hasher = new_hasher()
+        while chunk := f.read(1024 * 1024):
+            hasher.update(chunk)
+        return hasher.hexdigest()
+
+def walk_files(top, extensions, ignore_dirs=None):
+    """
+    Recursive os.scandir walk. Yields DirEntry objects (with cached stat
+    results) for files ending in one of the lowercase `extensions`. Pass a
+    tuple: str.endswith() checks all of its suffixes in one C call.
+    If ignore_dirs is given, those folder names and hidden folders are skipped.
+    """
+    try:
+        with os.scandir(top) as it:
+            for entry in it:
+                # One entry that can't be stat'ed doesn't end the walk of its folder
+                try:
+                    is_dir = entry.is_dir(follow_symlinks=False)
+                    is_match = not is_dir and entry.is_file() and entry.name.lower().endswith(extensions)
+                except OSError: continue
+                if is_dir:
+                    if ignore_dirs is None or (entry.name not in ignore_dirs and not entry.name.startswith('.')):
+                        yield from walk_files(entry.path, extensions, ignore_dirs)
+                elif is_match:
+                    yield entry
+    except OSError: pass # Folder can't be listed
+
+def progress_printer(interval=PROGRESS_INTERVAL):
+    """
+    Returns show(text), which overwrites the current console line with `text`.
+    Redraws are throttled so terminal writes don't dominate scans of many small files.
+    """
+    last_shown = 0.0
+    def show(text):
+        nonlocal last_shown
+        now = time.monotonic()
+        if now - last_shown > interval:
+            sys.stdout.write(f"{text}\r")
+            sys.stdout.flush()
+            last_shown = now
+    return show
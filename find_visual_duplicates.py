@@ -1,9 +1,15 @@
 import os
 import hashlib
 import argparse
+import filecmp
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from PIL import Image
 
+from file_utils import get_file_hash, walk_files, progress_printer
+from image_utils import load_draft
+
 # --- LIBRARIES ---
 # Image Support
 try:
@@ -13,22 +19,58 @@ try:
 except ImportError:
     pass
 
-# Video Support (Hachoir)
+# Compiled dHash kernel (optional: cythonize -i phash_ext.pyx)
 try:
-    from hachoir.parser import createParser
-    from hachoir.metadata import extractMetadata
-    HACHOIR_AVAILABLE = True
+    from phash_ext import dhash_u8
 except ImportError:
-    HACHOIR_AVAILABLE = False
-    print("[WARNING] 'hachoir' not installed. Video dates will rely on file system.")
+    dhash_u8 = None
+
+# Video Support (MP4/MOV parsed directly, pymediainfo > hachoir for the rest)
+from video_meta import read_video_meta, MEDIAINFO_AVAILABLE, HACHOIR_AVAILABLE
+if not (MEDIAINFO_AVAILABLE or HACHOIR_AVAILABLE):
+    print("[WARNING] 'pymediainfo' not installed. Non-MP4/MOV video dates will rely on file system.")
 
 # --- CONFIGURATION ---
 IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.tiff', '.bmp', '.gif', '.heic', '.heif'}
 VIDEO_EXTENSIONS = {'.mp4', '.mov', '.avi', '.mkv', '.wmv', '.flv', '.mts', '.m2ts'}
+VIDEO_EXTS_T = tuple(VIDEO_EXTENSIONS)
+ALL_EXTS_T = tuple(IMAGE_EXTENSIONS | VIDEO_EXTENSIONS)
+HASH_WORKERS = os.cpu_count() or 4
+QUICK_HASH_BYTES = 64 * 1024
+DHASH_SIZE = 8  # 8x8 comparisons -> 64-bit perceptual hash
+# Flat or low-texture images (black frames, blank pages, blown-out shots) all hash to these
+DEGENERATE_DHASHES = {'0' * (DHASH_SIZE * DHASH_SIZE // 4), 'f' * (DHASH_SIZE * DHASH_SIZE // 4)}
+THUMB_SIZE = 64 # Smallest JPEG draft size requested before the final resize
+
+def gray_thumbnail(filepath, width, height):
+    """
+    Decodes an image straight to a small 8-bit grayscale buffer (width x height bytes).
+    A HEIC (Pillow) and its JPEG export (libvips) must hash alike, so the decoder only
+    decodes; the grayscale conversion and resampling always run in Pillow.
+    """
+    img = load_draft(filepath, (THUMB_SIZE, THUMB_SIZE))
+    return img.convert('L').resize((width, height), Image.Resampling.LANCZOS).tobytes()
+
+def dhash(pixels):
+    """
+    Difference hash over a 9x8 grayscale thumbnail: each bit records whether
+    a pixel is brighter than its left neighbour. Same bit layout as
+    imagehash.dhash, returned as a 16-char hex string.
+    """
+    if dhash_u8:
+        value = dhash_u8(memoryview(pixels).cast('B', (DHASH_SIZE, DHASH_SIZE + 1)))
+        return f"{value:0{DHASH_SIZE * DHASH_SIZE // 4}x}"
+
+    value = 0
+    for row in range(DHASH_SIZE):
+        offset = row * (DHASH_SIZE + 1)
+        for col in range(DHASH_SIZE):
+            value = (value << 1) | (pixels[offset + col + 1] > pixels[offset + col])
+    return f"{value:0{DHASH_SIZE * DHASH_SIZE // 4}x}"
 
 def get_content_hash(filepath):
     """
-    IMAGES: Decodes pixels and hashes them (Visual).
+    IMAGES: Perceptual hash of a tiny thumbnail (Visual, survives resizing/re-encoding).
     VIDEOS: Hashes the file content stream (Binary).
     """
     ext = os.path.splitext(filepath)[1].lower()
@@ -36,44 +78,64 @@ def get_content_hash(filepath):
     # 1. VISUAL HASH (Images)
     if ext in IMAGE_EXTENSIONS:
         try:
-            with Image.open(filepath) as img:
-                # Convert to RGB to ensure consistent pixel data
-                img = img.convert('RGB')
-                return hashlib.sha256(img.tobytes()).hexdigest()
+            value = dhash(gray_thumbnail(filepath, DHASH_SIZE + 1, DHASH_SIZE))
         except Exception:
             # If image is corrupt, we can't visually compare it.
             return None
+        # A hash without any gradient says nothing about the picture; never group on it
+        return None if value in DEGENERATE_DHASHES else value
 
     # 2. BINARY HASH (Videos)
     elif ext in VIDEO_EXTENSIONS:
         try:
-            hasher = hashlib.sha256()
-            with open(filepath, 'rb') as f:
-                while chunk := f.read(1024 * 1024): # Read in 1MB chunks
-                    hasher.update(chunk)
-            return hasher.hexdigest()
+            return get_file_hash(filepath)
         except Exception:
             return None
 
     return None
 
+def quick_hash(filepath):
+    """ Hashes only the first 64 KB. Cheap pre-filter before a full binary hash. """
+    try:
+        with open(filepath, 'rb') as f:
+            return hashlib.blake2b(f.read(QUICK_HASH_BYTES)).digest()
+    except OSError:
+        return None
+
+def get_pixel_count(filepath):
+    """ Width x height from the image header (no decode). 0 for videos and unreadable files. """
+    if not filepath.lower().endswith(VIDEO_EXTS_T):
+        try:
+            with Image.open(filepath) as img:
+                return img.width * img.height
+        except Exception: pass
+    return 0
+
+def is_identical(keeper_path, dup_path):
+    """
+    True if the copy has the same bytes as the kept file, or decodes to the same
+    pixels (e.g. the same photo with edited EXIF). Unreadable files never count.
+    """
+    try:
+        if filecmp.cmp(keeper_path, dup_path, shallow=False):
+            return True
+        with Image.open(keeper_path) as keeper_img, Image.open(dup_path) as dup_img:
+            if keeper_img.size != dup_img.size:
+                return False
+            return keeper_img.convert('RGB').tobytes() == dup_img.convert('RGB').tobytes()
+    except Exception:
+        return False
+
 def get_date_taken(filepath):
     """
     Returns the oldest possible date for the file (Video Meta > EXIF > File System).
     """
     ext = os.path.splitext(filepath)[1].lower()
     
-    # A. VIDEOS (Try Hachoir first)
-    if ext in VIDEO_EXTENSIONS and HACHOIR_AVAILABLE:
-        try:
-            parser = createParser(filepath)
-            if parser:
-                with parser:
-                    metadata = extractMetadata(parser)
-                    if metadata:
-                        date_found = metadata.get('creation_date') or metadata.get('date_time_original')
-                        if date_found: return date_found
-        except: pass
+    # A. VIDEOS (Container metadata first)
+    if ext in VIDEO_EXTENSIONS:
+        date_found = read_video_meta(filepath)[1]
+        if date_found: return date_found
 
     # B. IMAGES (Try EXIF)
     if ext in IMAGE_EXTENSIONS:
@@ -98,7 +160,11 @@ def get_date_taken(filepath):
     # C. FALLBACK (File System)
     return datetime.fromtimestamp(os.path.getmtime(filepath))
 
-def find_duplicates(folder, delete=False):
+def find_duplicates(folder, delete=False, delete_similar=False):
+    """
+    delete: removes copies with the same bytes or the same pixels as the kept file.
+    delete_similar: also removes images that only match visually (resized/re-encoded copies).
+    """
     folder = os.path.abspath(folder)
     print(f"Scanning {folder} for duplicates (Images & Videos)...")
     
@@ -107,74 +173,110 @@ def find_duplicates(folder, delete=False):
     
     count = 0
     
-    # 1. SCAN AND HASH
-    for root, dirs, files in os.walk(folder):
-        for filename in files:
-            ext = os.path.splitext(filename)[1].lower()
-            if ext not in IMAGE_EXTENSIONS and ext not in VIDEO_EXTENSIONS:
-                continue
-            
-            filepath = os.path.join(root, filename)
-            count += 1
-            print(f"Hashing {count}: {filename}...", end='\r')
-            
-            content_hash = get_content_hash(filepath)
+    # 1. SCAN
+    paths = []
+    sizes = {}
+    videos_by_size = defaultdict(list)
+    for entry in walk_files(folder, ALL_EXTS_T):
+        count += 1
+        sizes[entry.path] = entry.stat().st_size
+        if entry.name.lower().endswith(VIDEO_EXTS_T):
+            videos_by_size[sizes[entry.path]].append(entry.path)
+        else:
+            # Visually matching images can differ in size, so all of them get hashed
+            paths.append(entry.path)
+
+    # Videos are compared byte-for-byte: only a size collision whose first
+    # 64 KB also collide needs the full hash.
+    for same_size in videos_by_size.values():
+        if len(same_size) < 2:
+            continue
+        by_prefix = defaultdict(list)
+        for filepath in same_size:
+            by_prefix[quick_hash(filepath)].append(filepath)
+        for prefix, group in by_prefix.items():
+            if prefix and len(group) > 1:
+                paths.extend(group)
+
+    # 2. HASH on worker threads (pixel hashing and file reads release the GIL)
+    executor = ThreadPoolExecutor(max_workers=HASH_WORKERS)
+    try:
+        results = zip(paths, executor.map(get_content_hash, paths))
+        show_progress = progress_printer()
+        for hashed, (filepath, content_hash) in enumerate(results, 1):
+            show_progress(f"Hashing {hashed}: {os.path.basename(filepath)}...")
             
             if content_hash:
-                date_taken = get_date_taken(filepath)
-                
                 if content_hash not in files_by_hash:
                     files_by_hash[content_hash] = []
                 
                 files_by_hash[content_hash].append({
                     'path': filepath,
-                    'date': date_taken
+                    'date': None,
+                    'pixels': 0,
+                    'size': sizes[filepath]
                 })
 
-    print(f"\nScanned {count} files.")
+        # Resolution and dates only decide which copy is kept, so unique files never
+        # have their headers / EXIF / video metadata parsed.
+        grouped = [f for file_list in files_by_hash.values() if len(file_list) > 1 for f in file_list]
+        grouped_paths = [f['path'] for f in grouped]
+        for info, pixels, date_taken in zip(grouped, executor.map(get_pixel_count, grouped_paths),
+                                            executor.map(get_date_taken, grouped_paths)):
+            info['pixels'], info['date'] = pixels, date_taken
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+    print(f"\nScanned {count} files ({len(paths)} hashed).")
     print("Analyzing duplicates...")
     print("-" * 50)
 
     total_dups_found = 0
     bytes_saved = 0
 
-    # 2. ANALYZE
+    # 3. ANALYZE
     for content_hash, file_list in files_by_hash.items():
         if len(file_list) > 1:
-            # Sort: Oldest Date First, then Shortest Filename
-            file_list.sort(key=lambda x: (x['date'], len(x['path'])))
-            
-            keeper = file_list[0]
-            duplicates = file_list[1:]
+            # Keep: Most Pixels, then Largest File (a resized or re-encoded copy is never
+            # kept over its original), then Oldest Date, then Shortest Filename (single O(k) pass)
+            keeper = min(file_list, key=lambda x: (-x['pixels'], -x['size'], x['date'], len(x['path'])))
+            duplicates = [f for f in file_list if f is not keeper]
             
             print(f"\n[GROUP] Found {len(duplicates)} duplicate(s):")
-            print(f"  KEEPING (Oldest): {os.path.basename(keeper['path'])} ({keeper['date']})")
+            print(f"  KEEPING:          {os.path.basename(keeper['path'])} ({keeper['date']})")
             
             for dup in duplicates:
-                print(f"  DUPLICATE:        {os.path.basename(dup['path'])} ({dup['date']})")
+                # Videos share a full file hash; an image's dHash match still needs a byte or pixel comparison
+                is_video = dup['path'].lower().endswith(VIDEO_EXTS_T)
+                identical = is_video or is_identical(keeper['path'], dup['path'])
+                label = "DUPLICATE:       " if identical else "SIMILAR:         "
+                print(f"  {label} {os.path.basename(dup['path'])} ({dup['date']})")
                 
-                file_size = os.path.getsize(dup['path'])
+                file_size = dup['size']
                 total_dups_found += 1
                 bytes_saved += file_size
                 
-                if delete:
+                if (delete and identical) or delete_similar:
                     try:
                         os.remove(dup['path'])
                         print(f"     -> DELETED")
                     except Exception as e:
                         print(f"     -> ERROR DELETING: {e}")
-                else:
+                elif identical:
                     print(f"     -> (Run with --delete to remove)")
+                else:
+                    print(f"     -> (Only visually similar: run with --delete-similar to remove)")
 
     print("-" * 50)
     print(f"Total Duplicates Found: {total_dups_found}")
     print(f"Potential Space Reclaimed: {bytes_saved / (1024*1024):.2f} MB")
 
 if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Find visually identical images and binary identical videos.")
+    parser = argparse.ArgumentParser(description="Find visually identical (incl. resized/re-encoded) images and binary identical videos.")
     parser.add_argument("folder", help="Folder to scan")
-    parser.add_argument("--delete", action="store_true", help="Actually delete the duplicates (Oldest is kept)")
+    parser.add_argument("--delete", action="store_true", help="Actually delete duplicates with identical bytes or pixels (highest resolution, then oldest, is kept)")
+    parser.add_argument("--delete-similar", action="store_true", help="Also delete images that only match visually (resized/re-encoded copies)")
     
     args = parser.parse_args()
     
-    find_duplicates(args.folder, args.delete)
\ No newline at end of file
+    find_duplicates(args.folder, args.delete, args.delete_similar)
\ No newline at end of file
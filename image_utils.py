@@ -0,0 +1,81 @@
+import os
+import multiprocessing
+from PIL import Image
+
+from file_utils import HASH_ALGO, new_hasher
+
+# --- LIBRARIES ---
+# Image Support
+try:
+    from pillow_heif import register_heif_opener
+    register_heif_opener()
+except ImportError:
+    pass
+
+# Fast Image Decode (libvips; Pillow is used when it's missing)
+try:
+    import pyvips
+except ImportError:
+    pyvips = None
+except OSError as e:
+    if multiprocessing.current_process().name == 'MainProcess': # Worker processes re-import this module
+        print(f"[WARNING] pyvips is installed but libvips failed to load ({e}). Decoding with Pillow.")
+    pyvips = None
+
+# --- CONFIGURATION ---
+VIPS_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.tiff'}  # HEIC/HEIF, BMP, GIF and RAW stay on Pillow
+VISUAL_THUMB_SIZE = 256
+# Tag for indices of visual hashes, so file-hash indices are never mixed in
+VISUAL_HASH_ALGO = f"{HASH_ALGO}+thumb{VISUAL_THUMB_SIZE}"
+
+def jpeg_draft_scale(width, height, size):
+    """ The libjpeg DCT scale (1/N) Pillow's draft() picks for a `size` request. """
+    scale = min(width // size[0], height // size[1])
+    for n in (8, 4, 2):
+        if scale >= n: return n
+    return 1
+
+def vips_decode(filepath, size):
+    """
+    Decodes with libvips into the same RGB image Image.open() + draft('RGB', size) gives
+    (no EXIF rotation, same JPEG DCT scale), or None for anything but 8-bit sRGB/grey.
+    """
+    img = pyvips.Image.new_from_file(filepath, access='sequential')
+    if img.format != 'uchar' or img.interpretation not in ('srgb', 'b-w'):
+        return None
+    if img.get('vips-loader') == 'jpegload':
+        shrink = jpeg_draft_scale(img.width, img.height, size)
+        if shrink > 1:
+            img = pyvips.Image.new_from_file(filepath, access='sequential', shrink=shrink)
+    # Alpha is dropped, as Pillow's convert('RGB') does
+    if img.bands >= 3:
+        return Image.frombytes('RGB', (img.width, img.height), img.extract_band(0, n=3).write_to_memory())
+    return Image.frombytes('L', (img.width, img.height), img[0].write_to_memory()).convert('RGB')
+
+def load_draft(filepath, size):
+    """
+    Returns the image as RGB, decoded at the reduced JPEG scale draft(size) allows.
+    libvips only decodes: it yields the same pixels as Pillow, so anything resampled
+    or hashed afterwards doesn't depend on which decoder was available.
+    """
+    ext = os.path.splitext(filepath)[1].lower()
+    if pyvips and ext in VIPS_EXTENSIONS:
+        try:
+            img = vips_decode(filepath, size)
+            if img: return img
+        except pyvips.Error: pass # Pillow gets a second try
+    with Image.open(filepath) as img:
+        # JPEG: let libjpeg decode at a reduced DCT scale (skips most of the IDCT)
+        img.draft('RGB', size)
+        return img.convert('RGB')
+
+def get_visual_hash(filepath):
+    """
+    Hash of a 256px thumbnail's pixels, not the file's bytes.
+    Raises if the file can't be decoded as an image.
+    """
+    img = load_draft(filepath, (VISUAL_THUMB_SIZE * 2, VISUAL_THUMB_SIZE * 2))
+    img.thumbnail((VISUAL_THUMB_SIZE, VISUAL_THUMB_SIZE), Image.Resampling.BILINEAR)
+    hasher = new_hasher()
+    hasher.update(img.tobytes())
+    return hasher.hexdigest()
@@ -0,0 +1,157 @@
+import os
+import json
+import time
+
+# Shared by update_index.py and organize_photos.py, which both write photo_index.jsonl.
+# Log format: a {"hash_algo": ...} header line, then one {"hash", "path", "size", "mtime"}
+# object per line. Replay is keyed by path, so every copy of the same content keeps its own
+# (size, mtime) fingerprint; a later line for a path replaces the earlier one.
+
+def stash_path(db_path, algo):
+    """ Where a log built with another hash algorithm is kept until that algorithm is back. """
+    return f"{db_path}.{algo}"
+
+def set_aside(db_path, target):
+    try:
+        os.replace(db_path, target)
+        return True
+    except OSError as e:
+        print(f"[ERROR] Could not move {os.path.basename(db_path)} aside: {e}")
+        return False
+
+def replay_log(db_path):
+    """
+    Returns (algo from the header, {path: record}). Malformed lines are skipped one by one.
+    A log without a header line has algo None; its first record is kept like the rest.
+    """
+    data = {}
+    db_algo = None
+    with open(db_path, 'r') as f:
+        for line_no, line in enumerate(f):
+            try:
+                entry = json.loads(line)
+                if line_no == 0 and 'hash_algo' in entry:
+                    db_algo = entry['hash_algo']
+                    continue
+                path = entry.pop('path')
+                if isinstance(path, str) and isinstance(entry['hash'], str):
+                    data[path] = entry
+            except (ValueError, KeyError, TypeError, AttributeError):
+                continue # Torn line from an interrupted run, or not an index record
+    return db_algo, data
+
+def paths_by_hash(data):
+    """ {hash: path} for duplicate lookups. The first path recorded for a hash wins, so it is stable across runs. """
+    by_hash = {}
+    for path, record in data.items():
+        by_hash.setdefault(record['hash'], path)
+    return by_hash
+
+def legacy_rejected(legacy_path, algo):
+    """
+    True if the original photo_index.json (a flat SHA-256 {hash: path} map) holds entries.
+    Those can't be migrated to `algo`; the file is left in place.
+    """
+    try:
+        with open(legacy_path, 'r') as f: legacy = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"[WARNING] Could not read {os.path.basename(legacy_path)}: {e}")
+        return True
+    if legacy:
+        print(f"[WARNING] {os.path.basename(legacy_path)} uses sha256, not {algo}, and can't be migrated. It is left untouched.")
+    return bool(legacy)
+
+def unusable(db_path, rebuild):
+    """ load_db's result for an existing index it can't use. """
+    if rebuild:
+        print("A new index will be built.")
+        return {}
+    print(f'Run update_index.py "{os.path.dirname(db_path)}" first to rebuild the index '
+          '(add --compare-mode content for the visual index).')
+    return None
+
+def load_db(db_path, algo, read_only=False, rebuild=False):
+    """
+    Replays the append-only index log into {path: {"hash", "size", "mtime"}}.
+    A log built with another algorithm is swapped for the log stashed for `algo`, if any;
+    it is never compacted away. Returns None if an existing index can't be used (unreadable,
+    or built with another algorithm and nothing stashed): without it, files already in the
+    folder would not be recognised. The caller must not write to the log then.
+    rebuild: update_index moves an unusable log aside and gets {} to re-index the folder;
+    None then means it could not be moved.
+    read_only: dry runs read the stashed log in place and move nothing.
+    """
+    if os.path.exists(db_path):
+        try:
+            db_algo, data = replay_log(db_path)
+        except (OSError, UnicodeDecodeError) as e:
+            print(f"[ERROR] Could not read {os.path.basename(db_path)}: {e}")
+            if not rebuild: return unusable(db_path, rebuild)
+            target = f"{db_path}.unreadable-{time.strftime('%Y%m%d-%H%M%S')}"
+            if not set_aside(db_path, target): return None
+            print(f"Moved it to {os.path.basename(target)}.")
+            return unusable(db_path, rebuild)
+        if db_algo == algo:
+            return data
+        if data:
+            print(f"[WARNING] {os.path.basename(db_path)} uses {db_algo}, not {algo}.")
+            has_stash = os.path.exists(stash_path(db_path, algo))
+            if not (rebuild or has_stash):
+                return unusable(db_path, rebuild)
+            target = stash_path(db_path, db_algo or 'unknown')
+            if read_only:
+                print("Ignoring it for this dry run.")
+            elif set_aside(db_path, target):
+                print(f"Kept it as {os.path.basename(target)}; it is restored when {db_algo} is in use again.")
+            else:
+                return None
+            if not has_stash:
+                return unusable(db_path, rebuild)
+
+    # No usable log: bring back one stashed for this algorithm
+    stashed = stash_path(db_path, algo)
+    if os.path.exists(stashed):
+        if read_only:
+            try: return replay_log(stashed)[1]
+            except (OSError, UnicodeDecodeError): return unusable(db_path, rebuild)
+        if set_aside(stashed, db_path):
+            print(f"[INFO] Restored the {algo} index from {os.path.basename(stashed)}.")
+            return load_db(db_path, algo, rebuild=rebuild)
+        return None
+    if os.path.exists(db_path):
+        return {} # Empty log: nothing to lose
+    legacy_path = os.path.splitext(db_path)[0] + '.json'
+    if os.path.exists(legacy_path) and legacy_rejected(legacy_path, algo):
+        return unusable(db_path, rebuild)
+    return {}
+
+def append_db(db_path, entries):
+    """
+    Appends new {path: record} entries to the index log, one JSON object per line.
+    The log must already exist (save_db writes it with its header).
+    """
+    if not os.path.exists(db_path):
+        print(f"[ERROR] Could not save database: {os.path.basename(db_path)} is missing.")
+        return False
+    try:
+        with open(db_path, 'a') as f:
+            for path, record in entries.items():
+                f.write(json.dumps({'hash': record['hash'], 'path': path, **record}) + '\n')
+        return True
+    except Exception as e:
+        print(f"[ERROR] Could not save database: {e}")
+        return False
+
+def save_db(db_path, data, algo):
+    """ Compacts the index log: rewrites it with a header and one line per entry. """
+    tmp_path = db_path + '.tmp'
+    try:
+        with open(tmp_path, 'w') as f:
+            f.write(json.dumps({'hash_algo': algo}) + '\n')
+            for path, record in data.items():
+                f.write(json.dumps({'hash': record['hash'], 'path': path, **record}) + '\n')
+        os.replace(tmp_path, db_path)
+        return True
+    except Exception as e:
+        print(f"[ERROR] Could not save database: {e}")
+        return False
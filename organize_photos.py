@@ -1,14 +1,18 @@
 import os
 import shutil
-import hashlib
-import json
 import argparse
 import sys
 import stat
 import time
+import signal
+from multiprocessing import Pool
 from datetime import datetime
 from PIL import Image
 
+from file_utils import HASH_ALGO, get_file_hash
+from image_utils import VISUAL_HASH_ALGO, get_visual_hash
+from index_db import load_db, append_db, save_db, paths_by_hash
+
 # --- LIBRARIES ---
 # Image Support
 try:
@@ -18,24 +22,20 @@ try:
 except ImportError:
     pass
 
-# Video Support (Hachoir)
-try:
-    from hachoir.parser import createParser
-    from hachoir.metadata import extractMetadata
-    HACHOIR_AVAILABLE = True
-except ImportError:
-    HACHOIR_AVAILABLE = False
-    print("[WARNING] 'hachoir' not installed. Cannot detect corrupt videos accurately.")
-    print("Run: pip install hachoir")
+# Video Support (MP4/MOV parsed directly, pymediainfo > hachoir for the rest)
+from video_meta import read_video_meta, MEDIAINFO_AVAILABLE, HACHOIR_AVAILABLE
 
 # --- CONFIGURATION ---
 MIN_FILE_SIZE = 102400
 MIN_DIMENSION = 600
 SEPARATE_NO_EXIF = True 
+ANALYZE_WORKERS = os.cpu_count() or 4
 
 IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.tiff', '.heic', '.heif'}
 RAW_EXTENSIONS = {'.arw', '.cr2', '.nef', '.dng'}
 VIDEO_EXTENSIONS = {'.mp4', '.mov', '.avi', '.mkv', '.wmv', '.flv', '.mts', '.m2ts'}
+VIDEO_EXTS_T = tuple(VIDEO_EXTENSIONS)
+ALL_EXTS_T = tuple(IMAGE_EXTENSIONS | VIDEO_EXTENSIONS | RAW_EXTENSIONS)
 IGNORE_DIRS = {'$RECYCLE.BIN', 'System Volume Information', 'Recycled', '.Trashes'}
 
 def debug_log(msg, debug_mode):
@@ -48,48 +48,30 @@ def get_hash(filepath, mode='file', debug_mode=False):
         if ext in IMAGE_EXTENSIONS or ext in RAW_EXTENSIONS:
             try:
                 debug_log(f"Visual hashing: {filepath}", debug_mode)
-                with Image.open(filepath) as img:
-                    return hashlib.sha256(img.tobytes()).hexdigest()
+                return get_visual_hash(filepath)
             except: pass
     
     debug_log(f"File hashing: {filepath}", debug_mode)
-    hasher = hashlib.sha256()
-    try:
-        with open(filepath, 'rb') as f:
-            while chunk := f.read(1024 * 1024):
-                hasher.update(chunk)
-        return hasher.hexdigest()
+    try: return get_file_hash(filepath)
     except: return None
 
 # --- NEW: VIDEO VALIDATOR ---
-def is_video_valid(filepath, debug_mode=False):
+def parse_video_once(filepath, debug_mode=False):
     """
-    Returns True if the video structure is readable.
-    Returns False if the file header/footer is corrupted.
+    Parses the container a single time for both the integrity check and the date.
+    Returns (is_valid, creation_date); is_valid is False if the file header/footer
+    is corrupted, creation_date is None when the metadata has no date.
     """
-    if not HACHOIR_AVAILABLE:
-        return True # Assume valid if we can't check
-    
-    try:
-        parser = createParser(filepath)
-        if not parser:
-            debug_log(f"Invalid Video Container: {filepath}", debug_mode)
-            return False
-            
-        with parser:
-            metadata = extractMetadata(parser)
-            if metadata:
-                # If we can read duration or width, it's likely playable
-                if metadata.get('duration') or metadata.get('width'):
-                    return True
-                    
-        debug_log(f"Video parsed but empty metadata: {filepath}", debug_mode)
-        return False
-    except Exception as e:
-        debug_log(f"Video Corruption Error: {e}", debug_mode)
-        return False
+    is_valid, creation_date, details = read_video_meta(filepath)
+    if not is_valid:
+        debug_log(f"Invalid Video ({details}): {filepath}", debug_mode)
+    return is_valid, creation_date
 
-def get_date_taken(filepath, debug_mode=False):
+def get_date_taken(filepath, debug_mode=False, video_date=None, mtime=None):
+    """
+    Videos: pass the creation date already read by parse_video_once().
+    mtime: the st_mtime already stat'ed by the walker, used for the fallback.
+    """
     file_ext = os.path.splitext(filepath)[1].lower()
     
     # 1. RAW FILES
@@ -113,23 +95,15 @@ def get_date_taken(filepath, debug_mode=False):
     
     # 3. VIDEOS (Metadata)
     elif file_ext in VIDEO_EXTENSIONS:
-        if HACHOIR_AVAILABLE:
-            try:
-                parser = createParser(filepath)
-                if parser:
-                    with parser:
-                        metadata = extractMetadata(parser)
-                        if metadata:
-                            date_found = metadata.get('creation_date') or metadata.get('date_time_original')
-                            if date_found: return date_found, 'video_meta'
-            except: pass
+        if video_date: return video_date, 'video_meta'
 
     # 4. FALLBACK
     debug_log("Using File System Date (mtime)", debug_mode)
-    return datetime.fromtimestamp(os.path.getmtime(filepath)), 'mtime'
+    if mtime is None: mtime = os.path.getmtime(filepath)
+    return datetime.fromtimestamp(mtime), 'mtime'
 
-def passes_filters(filepath, debug_mode=False):
-    if os.path.getsize(filepath) < MIN_FILE_SIZE: 
+def passes_filters(filepath, size, debug_mode=False):
+    if size < MIN_FILE_SIZE: 
         debug_log("Filter: Too small", debug_mode)
         return False
     ext = os.path.splitext(filepath)[1].lower()
@@ -143,17 +117,9 @@ def passes_filters(filepath, debug_mode=False):
         except: return False
     return True
 
-def load_db(db_path):
-    if os.path.exists(db_path):
-        try:
-            with open(db_path, 'r') as f: return json.load(f)
-        except: pass
-    return {}
-
-def save_db(db_path, data):
-    try:
-        with open(db_path, 'w') as f: json.dump(data, f, indent=4)
-    except: pass
+def index_algo(compare_mode):
+    # Visual hashes are taken over a 256px thumbnail; tag them so file-hash indices aren't reused
+    return VISUAL_HASH_ALGO if compare_mode == 'content' else HASH_ALGO
 
 def force_delete(filepath):
     try:
@@ -171,15 +137,23 @@ def force_move(src, dst):
             raise OSError("Copy failed")
         force_delete(src)
 
-def build_size_map(dest_dir):
-    print(f"Building Size Map of {dest_dir}...")
-    size_map = set()
-    for root, _, files in os.walk(dest_dir):
-        for f in files:
-            try: size_map.add(os.path.getsize(os.path.join(root, f)))
-            except: pass
-    print(f"Mapped sizes of {len(size_map)} existing files.")
-    return size_map
+def reserve_target(folder, base, ext, folder_names):
+    """
+    Returns folder/base+ext, or the first free base_N+ext, without stat'ing candidates.
+    folder_names caches each folder's listing (read once) plus names handed out this run.
+    """
+    names = folder_names.get(folder)
+    if names is None:
+        try: names = {os.path.normcase(n) for n in os.listdir(folder)}
+        except FileNotFoundError: names = set()
+        folder_names[folder] = names
+    name = base + ext
+    counter = 1
+    while os.path.normcase(name) in names:
+        name = f"{base}_{counter}{ext}"
+        counter += 1
+    names.add(os.path.normcase(name))
+    return os.path.join(folder, name)
 
 def safe_walker(top_dir, debug_mode=False):
     if debug_mode: print(f"[DEBUG] Entering directory: {top_dir}", flush=True)
@@ -191,25 +165,75 @@ def safe_walker(top_dir, debug_mode=False):
                 if entry.is_dir():
                     yield from safe_walker(entry.path, debug_mode)
                 elif entry.is_file():
-                    yield entry.path
+                    yield entry
     except: pass
 
+_worker_settings = {}
+
+def init_worker(compare_mode, debug_mode):
+    signal.signal(signal.SIGINT, signal.SIG_IGN) # Ctrl+C is handled by the parent process
+    _worker_settings.update(compare_mode=compare_mode, debug_mode=debug_mode)
+
+def analyze_file(item):
+    """
+    Read-only checks for one source file (filters, video integrity, hash, date).
+    Runs in a worker process; all moves and index writes stay in the main loop.
+    `item` is (path, stat result from the walker's DirEntry, or None if that failed).
+    """
+    filepath, st = item
+    compare_mode = _worker_settings['compare_mode']
+    debug_mode = _worker_settings['debug_mode']
+    info = {'path': filepath, 'junk': False, 'corrupt': False, 'hash': None, 'date': None, 'source': None, 'error': None}
+    try:
+        st = st or os.stat(filepath)
+        if not passes_filters(filepath, st.st_size, debug_mode):
+            info['junk'] = True
+            return info
+
+        video_date = None
+        if filepath.lower().endswith(VIDEO_EXTS_T):
+            is_valid, video_date = parse_video_once(filepath, debug_mode)
+            if not is_valid:
+                info['corrupt'] = True
+                return info
+
+        # Every file that gets this far is either a duplicate or sorted and indexed,
+        # so it is always hashed here rather than serially in the main loop
+        info['hash'] = get_hash(filepath, mode=compare_mode, debug_mode=debug_mode)
+
+        info['date'], info['source'] = get_date_taken(filepath, debug_mode, video_date, st.st_mtime)
+    except (PermissionError, OSError) as e:
+        info['error'] = e
+    return info
+
 def organize_photos(src_dir, dest_dir, dry_run=False, move_files=False, 
                    dup_action='move', junk_action='ignore', compare_mode='file', debug_mode=False):
     
     src_dir = os.path.abspath(src_dir)
     dest_dir = os.path.abspath(dest_dir)
+
+    # Warned here, not at import: worker processes re-import this module
+    if not (MEDIAINFO_AVAILABLE or HACHOIR_AVAILABLE):
+        print("[WARNING] 'pymediainfo' not installed. Only MP4/MOV videos can be checked for corruption.")
+        print("Run: pip install pymediainfo")
     
     # Init variables first
     action_verb = "MOVING" if move_files else "COPYING"
     stats = {'success': 0, 'duplicates': 0, 'junk': 0, 'errors': 0, 'no_meta': 0, 'corrupt_video': 0, 'deleted_dups': 0}
     SAVE_INTERVAL = 50 
     
-    index_filename = "photo_index_visual.json" if compare_mode == 'content' else "photo_index.json"
+    index_filename = "photo_index_visual.jsonl" if compare_mode == 'content' else "photo_index.jsonl"
     db_file = os.path.join(dest_dir, index_filename)
-    seen_hashes = load_db(db_file)
-    
-    dest_size_map = build_size_map(dest_dir)
+    db_algo = index_algo(compare_mode)
+    known_files = load_db(db_file, db_algo, read_only=dry_run)
+    if known_files is None:
+        # Without the index, every file already in the destination would be copied in again
+        print("[ERROR] The existing index can't be used. Nothing was sorted.")
+        return
+    seen_hashes = paths_by_hash(known_files)
+    unsaved = {}
+    # Start the run from a compacted log; new entries are only appended after this
+    write_index = not dry_run and save_db(db_file, known_files, db_algo)
 
     duplicates_dir = os.path.join(dest_dir, "Duplicates")
     junk_dir = os.path.join(dest_dir, "Skipped_Junk")
@@ -217,31 +241,49 @@ def organize_photos(src_dir, dest_dir, dry_run=False, move_files=False,
     corrupt_video_dir = os.path.join(dest_dir, "Corrupt_Videos") # New Folder
 
     if not dry_run:
-        if dup_action == 'move' and not os.path.exists(duplicates_dir): os.makedirs(duplicates_dir)
-        if junk_action == 'move' and not os.path.exists(junk_dir): os.makedirs(junk_dir)
-        if SEPARATE_NO_EXIF and not os.path.exists(no_meta_dir): os.makedirs(no_meta_dir)
-        if not os.path.exists(corrupt_video_dir): os.makedirs(corrupt_video_dir)
+        if dup_action == 'move': os.makedirs(duplicates_dir, exist_ok=True)
+        if junk_action == 'move': os.makedirs(junk_dir, exist_ok=True)
+        if SEPARATE_NO_EXIF: os.makedirs(no_meta_dir, exist_ok=True)
+        os.makedirs(corrupt_video_dir, exist_ok=True)
+
+    # Month folders made so far, and the file names taken in each target folder
+    created_dirs = set()
+    folder_names = {}
 
     files_found = 0
     print(f"Scanning {src_dir} (Video Integrity Check Active)...")
 
-    try:
-        for original_path in safe_walker(src_dir, debug_mode):
+    def candidates():
+        nonlocal files_found
+        for entry in safe_walker(src_dir, debug_mode):
             files_found += 1
             if files_found % 100 == 0:
                 print(f"[Scanning] Found {files_found} files...", end='\r', flush=True)
 
+            if not entry.name.lower().endswith(ALL_EXTS_T):
+                continue
+            # DirEntry can't be pickled; its stat result can
+            try: st = entry.stat()
+            except OSError: st = None
+            yield entry.path, st
+
+    # Decode, hash and metadata parsing run on all cores in worker processes
+    # (Pillow's decode path holds the GIL). Results arrive in walk order, so which of two
+    # identical files is sorted (and which _N suffix a name gets) is the same on every run.
+    pool = Pool(ANALYZE_WORKERS, initializer=init_worker, initargs=(compare_mode, debug_mode))
+    try:
+        for info in pool.imap(analyze_file, candidates(), chunksize=32):
+            original_path = info['path']
             filename = os.path.basename(original_path)
             file_ext = os.path.splitext(filename)[1].lower()
-            
-            if file_ext not in IMAGE_EXTENSIONS and file_ext not in VIDEO_EXTENSIONS and file_ext not in RAW_EXTENSIONS:
-                continue
 
             debug_log(f"--- Processing: {filename} ---", debug_mode)
 
             try:
+                if info['error']: raise info['error']
+
                 # 1. Filters (Junk)
-                if not passes_filters(original_path, debug_mode):
+                if info['junk']:
                     stats['junk'] += 1
                     if junk_action == 'delete': force_delete(original_path)
                     elif junk_action == 'move' and not dry_run: 
@@ -251,26 +293,17 @@ def organize_photos(src_dir, dest_dir, dry_run=False, move_files=False,
                     continue
                 
                 # 2. Corrupt Video Check
-                if file_ext in VIDEO_EXTENSIONS:
-                    if not is_video_valid(original_path, debug_mode):
-                        stats['corrupt_video'] += 1
-                        print(f"[CORRUPT VIDEO] {filename} -> Corrupt_Videos/")
-                        if not dry_run:
-                            target = os.path.join(corrupt_video_dir, filename)
-                            if move_files: force_move(original_path, target)
-                            else: shutil.copy2(original_path, target)
-                        continue
-
-                # 3. Size Check (Optimization)
-                src_size = os.path.getsize(original_path)
-                if src_size not in dest_size_map:
-                    debug_log("Size unique. Skipping hash.", debug_mode)
-                    file_hash = None
-                else:
-                    debug_log("Size match. Hashing...", debug_mode)
-                    file_hash = get_hash(original_path, mode=compare_mode, debug_mode=debug_mode)
+                if info['corrupt']:
+                    stats['corrupt_video'] += 1
+                    print(f"[CORRUPT VIDEO] {filename} -> Corrupt_Videos/")
+                    if not dry_run:
+                        target = os.path.join(corrupt_video_dir, filename)
+                        if move_files: force_move(original_path, target)
+                        else: shutil.copy2(original_path, target)
+                    continue
 
-                # 4. Duplicates
+                # 3. Duplicates (hashed by the worker)
+                file_hash = info['hash']
                 if file_hash and file_hash in seen_hashes:
                     debug_log("Duplicate detected.", debug_mode)
                     stats['duplicates'] += 1
@@ -284,19 +317,15 @@ def organize_photos(src_dir, dest_dir, dry_run=False, move_files=False,
                         print(f"[IGNORED DUP] {filename}")
                     continue
 
-                # 5. Sorting
-                date_obj, source_type = get_date_taken(original_path, debug_mode)
+                # 4. Sorting
+                date_obj, source_type = info['date'], info['source']
                 is_image = file_ext in IMAGE_EXTENSIONS or file_ext in RAW_EXTENSIONS
                 
                 if SEPARATE_NO_EXIF and is_image and source_type == 'mtime':
                     stats['no_meta'] += 1
                     if not dry_run:
-                        target_path = os.path.join(no_meta_dir, filename)
-                        counter = 1
-                        while os.path.exists(target_path):
-                            base, ext = os.path.splitext(filename)
-                            target_path = os.path.join(no_meta_dir, f"{base}_{counter}{ext}")
-                            counter += 1
+                        base, ext = os.path.splitext(filename)
+                        target_path = reserve_target(no_meta_dir, base, ext, folder_names)
                         if move_files: force_move(original_path, target_path)
                         else: shutil.copy2(original_path, target_path)
                         print(f"[NO METADATA] {filename}")
@@ -304,32 +333,31 @@ def organize_photos(src_dir, dest_dir, dry_run=False, move_files=False,
 
                 year_folder = date_obj.strftime('%Y')
                 month_folder = date_obj.strftime('%m-%B')
-                new_filename = date_obj.strftime('%Y-%m-%d_%H-%M-%S') + file_ext
                 target_folder = os.path.join(dest_dir, year_folder, month_folder)
                 
                 if not dry_run:
-                    if not os.path.exists(target_folder): os.makedirs(target_folder)
+                    if target_folder not in created_dirs:
+                        os.makedirs(target_folder, exist_ok=True)
+                        created_dirs.add(target_folder)
                     
-                    target_path = os.path.join(target_folder, new_filename)
-                    counter = 1
-                    while os.path.exists(target_path):
-                        name_no_ext = date_obj.strftime('%Y-%m-%d_%H-%M-%S')
-                        target_path = os.path.join(target_folder, f"{name_no_ext}_{counter}{file_ext}")
-                        counter += 1
+                    name_no_ext = date_obj.strftime('%Y-%m-%d_%H-%M-%S')
+                    target_path = reserve_target(target_folder, name_no_ext, file_ext, folder_names)
                     
                     if move_files: force_move(original_path, target_path)
                     else: shutil.copy2(original_path, target_path)
                     
                     print(f"[OK] {filename} -> {year_folder}/{month_folder}")
 
-                    if not file_hash:
-                        file_hash = get_hash(target_path, mode=compare_mode, debug_mode=debug_mode)
-                    
                     if file_hash:
-                        seen_hashes[file_hash] = os.path.relpath(target_path, dest_dir)
-                        dest_size_map.add(src_size)
+                        # Same (path, size, mtime) fingerprint update_index uses to skip unchanged files
+                        target_stat = os.stat(target_path)
+                        rel_path = os.path.relpath(target_path, dest_dir)
+                        unsaved[rel_path] = {'hash': file_hash, 'size': target_stat.st_size, 'mtime': target_stat.st_mtime}
+                        seen_hashes[file_hash] = rel_path
                         stats['success'] += 1
-                        if stats['success'] % SAVE_INTERVAL == 0: save_db(db_file, seen_hashes)
+                        if write_index and stats['success'] % SAVE_INTERVAL == 0:
+                            append_db(db_file, unsaved)
+                            unsaved.clear()
                 else:
                     print(f"[DRY RUN] {filename} -> {year_folder}/{month_folder}")
 
@@ -341,7 +369,9 @@ def organize_photos(src_dir, dest_dir, dry_run=False, move_files=False,
         print("\n[STOP] User stopped.")
     
     finally:
-        if not dry_run: save_db(db_file, seen_hashes)
+        pool.terminate()
+        pool.join()
+        if write_index: append_db(db_file, unsaved)
         print("-" * 40)
         print(f"Action: {action_verb}")
         print(f"Sorted:         {stats['success']}")
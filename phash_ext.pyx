@@ -0,0 +1,27 @@
+# cython: language_level=3, boundscheck=False, wraparound=False, cdivision=True
+"""
+Compiled dHash kernel for find_visual_duplicates.py.
+
+Optional: build it in place with `cythonize -i phash_ext.pyx`.
+Without the built module the script uses its pure-Python loop.
+"""
+from libc.stdint cimport uint8_t, uint64_t
+
+cpdef uint64_t dhash_u8(const uint8_t[:, ::1] grayscale):
+    """
+    Difference hash of a (rows x cols+1) 8-bit grayscale thumbnail.
+    Each bit is set when a pixel is brighter than its left neighbour,
+    packed row-major with the first comparison in the most significant bit.
+    """
+    cdef Py_ssize_t rows = grayscale.shape[0]
+    cdef Py_ssize_t cols = grayscale.shape[1] - 1
+    cdef Py_ssize_t r, c
+    cdef uint64_t value = 0
+
+    if rows * cols > 64:
+        raise ValueError("dhash_u8 packs at most 64 comparisons")
+
+    for r in range(rows):
+        for c in range(cols):
+            value = (value << 1) | (grayscale[r, c + 1] > grayscale[r, c])
+    return value
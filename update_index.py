@@ -1,9 +1,12 @@
 import os
-import hashlib
-import json
 import time
 import argparse
 import sys
+from concurrent.futures import ThreadPoolExecutor
+
+from file_utils import HASH_ALGO, get_file_hash, walk_files, progress_printer
+from image_utils import VISUAL_HASH_ALGO, get_visual_hash
+from index_db import load_db, append_db, save_db, paths_by_hash
 
 # --- CONFIGURATION ---
 EXTENSIONS = {
@@ -11,36 +14,24 @@ EXTENSIONS = {
     '.arw', '.cr2', '.nef', '.dng',
     '.mp4', '.mov', '.avi', '.mkv', '.wmv', '.flv', '.mts', '.m2ts'
 }
+EXTENSIONS_T = tuple(EXTENSIONS)
+HASH_WORKERS = os.cpu_count() or 4
 
-def get_file_hash(filepath):
-    """ Generates SHA-256 hash. """
-    hasher = hashlib.sha256()
+def get_hash_or_log(filepath, compare_mode='file'):
+    """
+    File hash, or None (with the error printed) if the file can't be read.
+    compare_mode 'content' hashes images the way organize_photos --compare-mode content does.
+    """
     try:
-        with open(filepath, 'rb') as f:
-            while chunk := f.read(8192):
-                hasher.update(chunk)
-        return hasher.hexdigest()
+        if compare_mode == 'content':
+            try: return get_visual_hash(filepath)
+            except Exception: pass # Not a decodable image: fall back to the file hash
+        return get_file_hash(filepath)
     except Exception as e:
         print(f"Error reading {filepath}: {e}")
         return None
 
-def load_db(db_path):
-    if os.path.exists(db_path):
-        try:
-            with open(db_path, 'r') as f:
-                return json.load(f)
-        except: pass
-    return {}
-
-def save_db(db_path, data):
-    try:
-        with open(db_path, 'w') as f:
-            json.dump(data, f, indent=4)
-        print(f"[SAVED] Database updated at {db_path}")
-    except Exception as e:
-        print(f"[ERROR] Could not save database: {e}")
-
-def update_index(target_folder):
+def update_index(target_folder, compare_mode='file'):
     # Ensure the path is absolute (handles relative paths like '.')
     target_folder = os.path.abspath(target_folder)
     
@@ -48,61 +39,78 @@ def update_index(target_folder):
         print(f"[ERROR] Path does not exist: {target_folder}")
         return
 
-    db_file = os.path.join(target_folder, "photo_index.json")
+    # The visual index is what organize_photos --compare-mode content reads
+    if compare_mode == 'content':
+        db_file, db_algo = os.path.join(target_folder, "photo_index_visual.jsonl"), VISUAL_HASH_ALGO
+    else:
+        db_file, db_algo = os.path.join(target_folder, "photo_index.jsonl"), HASH_ALGO
     
     print(f"Target Directory: {target_folder}")
     print(f"Database File:    {db_file}")
     
     # 1. Load existing data
-    seen_hashes = load_db(db_file)
-    initial_count = len(seen_hashes)
+    # {path: {"hash", "size", "mtime"}}: one fingerprint per file, including every copy of the same content
+    known_files = load_db(db_file, db_algo, rebuild=True)
+    if known_files is None:
+        print("[ERROR] The existing index can't be read or moved aside. Nothing was changed.")
+        return
+    initial_count = len(known_files)
     print(f"Loaded {initial_count} existing entries.")
+    # Start the run from a compacted log; new entries are only appended after this
+    if not save_db(db_file, known_files, db_algo):
+        return
 
-    print(f"Scanning folder for new files...")
+    print(f"Scanning folder for new or changed files...")
     
     new_count = 0
+    unsaved = {}
     start_time = time.time()
 
     # 2. Walk the folder
-    for root, dirs, files in os.walk(target_folder):
-        for filename in files:
-            file_ext = os.path.splitext(filename)[1].lower()
-            if file_ext not in EXTENSIONS:
-                continue
-
-            # Skip the index file itself
-            if filename == "photo_index.json":
-                continue
+    to_index = []
+    for entry in walk_files(target_folder, EXTENSIONS_T):
+        # Create relative path from the target root
+        rel_path = os.path.relpath(entry.path, target_folder)
 
-            full_path = os.path.join(root, filename)
-            
-            # Create relative path from the target root
-            rel_path = os.path.relpath(full_path, target_folder)
+        # 3. Skip files whose (path, size, mtime) fingerprint is unchanged since they were hashed
+        st = entry.stat()
+        known = known_files.get(rel_path)
+        if known and known.get('size') == st.st_size and known.get('mtime') == st.st_mtime:
+            continue
 
-            # 3. Check if we already know this RELATIVE path
-            if rel_path in seen_hashes.values():
-                continue
+        to_index.append((entry.path, rel_path, st))
 
-            # 4. If unknown, HASH IT
-            print(f"Indexing: {filename}...", end='\r')
-            file_hash = get_file_hash(full_path)
+    # 4. HASH the unknown files on worker threads (hashing releases the GIL)
+    executor = ThreadPoolExecutor(max_workers=HASH_WORKERS)
+    try:
+        hashes = executor.map(get_hash_or_log, [full_path for full_path, _, _ in to_index],
+                              [compare_mode] * len(to_index))
+        show_progress = progress_printer()
+        for (full_path, rel_path, st), file_hash in zip(to_index, hashes):
+            show_progress(f"Indexing: {os.path.basename(full_path)}...")
             
             if file_hash:
-                seen_hashes[file_hash] = rel_path
+                # A changed file's new line replaces its old fingerprint on replay
+                record = {'hash': file_hash, 'size': st.st_size, 'mtime': st.st_mtime}
+                known_files[rel_path] = unsaved[rel_path] = record
                 new_count += 1
                 
                 # Periodic save
                 if new_count % 100 == 0:
-                    save_db(db_file, seen_hashes)
+                    if append_db(db_file, unsaved): print(f"[SAVED] Database updated at {db_file}")
+                    unsaved.clear()
+    finally:
+        executor.shutdown(cancel_futures=True)
 
     # 5. Final Save
-    save_db(db_file, seen_hashes)
+    if append_db(db_file, unsaved): print(f"[SAVED] Database updated at {db_file}")
     
     duration = time.time() - start_time
     print("\n" + "="*40)
     print(f"Scan Complete in {duration:.2f} seconds")
-    print(f"New items added: {new_count}")
-    print(f"Total items in index: {len(seen_hashes)}")
+    print(f"New or changed items indexed: {new_count}")
+    print(f"Total items in index: {len(known_files)}")
+    print(f"Unique contents:      {len(paths_by_hash(known_files))}")
     print("="*40)
 
 if __name__ == "__main__":
@@ -112,7 +120,10 @@ if __name__ == "__main__":
     # Add optional argument for the folder path
     parser.add_argument("folder", nargs="?", help="The folder to scan. Defaults to current directory.", default=os.getcwd())
     
+    parser.add_argument("--compare-mode", choices=['file', 'content'], default='file',
+                        help="'content' (re)builds the visual index used by organize_photos --compare-mode content.")
+    
     args = parser.parse_args()
     
     # Run the function with the provided or default folder
-    update_index(args.folder)
\ No newline at end of file
+    update_index(args.folder, args.compare_mode)
\ No newline at end of file
@@ -0,0 +1,128 @@
+import os
+import struct
+from datetime import datetime, timedelta
+
+# --- LIBRARIES ---
+# libmediainfo binding (C parser for MKV/AVI/MTS/...)
+try:
+    from pymediainfo import MediaInfo
+    MEDIAINFO_AVAILABLE = MediaInfo.can_parse()
+except ImportError:
+    MEDIAINFO_AVAILABLE = False
+
+# Pure-Python fallback (Hachoir)
+try:
+    from hachoir.parser import createParser
+    from hachoir.metadata import extractMetadata
+    HACHOIR_AVAILABLE = True
+except ImportError:
+    HACHOIR_AVAILABLE = False
+
+# --- CONFIGURATION ---
+ISO_BMFF_EXTENSIONS = {'.mp4', '.mov'}
+MP4_EPOCH = datetime(1904, 1, 1) # mvhd times are seconds since 1904-01-01 (UTC)
+
+def find_box(f, box_type, start, end):
+    """
+    Walks sibling MP4 boxes in [start, end) by seeking over them (only 8-16 header
+    bytes are read per box). Returns (payload_start, box_end) of the first `box_type`,
+    or None. A box that runs past `end` means the file is truncated.
+    """
+    pos = start
+    while pos + 8 <= end:
+        f.seek(pos)
+        size, found_type = struct.unpack('>I4s', f.read(8))
+        header_size = 8
+        if size == 1: # 64-bit size follows the type
+            size = struct.unpack('>Q', f.read(8))[0]
+            header_size = 16
+        elif size == 0: # Box extends to the end of the file
+            size = end - pos
+        if size < header_size or pos + size > end:
+            return None
+        if found_type == box_type:
+            return pos + header_size, pos + size
+        pos += size
+    return None
+
+def fast_video_meta(filepath):
+    """
+    MP4/MOV only: reads the creation time and duration straight from moov/mvhd
+    (a few dozen bytes) instead of parsing the whole container.
+    Returns (is_valid, creation_date, details).
+    """
+    file_size = os.path.getsize(filepath)
+    with open(filepath, 'rb') as f:
+        moov = find_box(f, b'moov', 0, file_size)
+        if not moov:
+            return False, None, "No moov atom (truncated or unfinished recording)"
+        mvhd = find_box(f, b'mvhd', *moov)
+        if not mvhd:
+            return False, None, "No mvhd header in moov atom"
+
+        f.seek(mvhd[0])
+        version = f.read(4)[0] # 1 byte version + 3 bytes flags
+        if version == 1:
+            creation, _, timescale, duration = struct.unpack('>QQIQ', f.read(28))
+        else:
+            creation, _, timescale, duration = struct.unpack('>IIII', f.read(16))
+
+        # Fragmented MP4 keeps the duration in moof fragments, announced by mvex
+        if not (timescale and duration) and not find_box(f, b'mvex', *moov):
+            return False, None, "Empty metadata (Zombie file)"
+
+    # A garbage timestamp only loses the date; it says nothing about the file's integrity
+    try: creation_date = MP4_EPOCH + timedelta(seconds=creation) if creation else None
+    except (OverflowError, ValueError): creation_date = None
+    seconds = duration / timescale if timescale else 0
+    return True, creation_date, f"Valid (Duration: {seconds:.1f}s)"
+
+def parse_mediainfo_date(text):
+    # e.g. "UTC 2021-06-01 12:30:00" or "2021-06-01 12:30:00 UTC"
+    try: return datetime.strptime(text.replace('UTC', '').strip()[:19], '%Y-%m-%d %H:%M:%S')
+    except (AttributeError, ValueError): return None
+
+def mediainfo_meta(filepath):
+    info = MediaInfo.parse(filepath)
+    if not info.general_tracks:
+        return False, None, "Header unreadable"
+    general = info.general_tracks[0]
+    duration = general.duration
+    width = info.video_tracks[0].width if info.video_tracks else None
+    if not (duration or width):
+        return False, None, "Empty metadata (Zombie file)"
+    date_text = general.encoded_date or general.tagged_date or general.recorded_date
+    return True, parse_mediainfo_date(date_text), f"Valid (Duration: {duration} ms, Res: {width})"
+
+def hachoir_meta(filepath):
+    parser = createParser(filepath)
+    if not parser:
+        return False, None, "Header unreadable"
+    with parser:
+        metadata = extractMetadata(parser)
+        if not metadata:
+            return False, None, "No metadata found"
+        # A valid video must have at least a duration or a resolution
+        duration = metadata.get('duration')
+        width = metadata.get('width')
+        if not (duration or width):
+            return False, None, "Empty metadata (Zombie file)"
+        creation_date = metadata.get('creation_date') or metadata.get('date_time_original')
+        return True, creation_date, f"Valid (Duration: {duration}, Res: {width})"
+
+def read_video_meta(filepath):
+    """
+    Returns (is_valid, creation_date, details) using the cheapest reader available:
+    MP4/MOV header parse > pymediainfo > hachoir. Unchecked files count as valid.
+    """
+    ext = os.path.splitext(filepath)[1].lower()
+    try:
+        if ext in ISO_BMFF_EXTENSIONS:
+            return fast_video_meta(filepath)
+        if MEDIAINFO_AVAILABLE:
+            return mediainfo_meta(filepath)
+        if HACHOIR_AVAILABLE:
+            return hachoir_meta(filepath)
+        return True, None, "Not checked (pymediainfo/hachoir not installed)"
+    except Exception as e:
+        return False, None, f"Crash during parse: {str(e)}"